@@ -9,8 +9,67 @@ AI 指令解析模組
 import logging
 import json
 import re
-from typing import Dict, Any, Optional, List
-import asyncio
+import functools
+from typing import Dict, Any, Optional, List, Tuple
+from config import IS_WINDOWS
+
+# 正則語法剖析器（Python 3.11 起移至 re._parser），用於驗證模式開頭的固定字串
+try:
+    from re import _parser as _sre_parse
+except ImportError:
+    import sre_parse as _sre_parse
+
+# 解析結果快取大小
+_PARSE_CACHE_SIZE = 512
+
+# 正則表達式中的特殊字元，用於擷取模式開頭的固定字串
+_REGEX_META_CHARS = set(".^$*+?{}[]\\|()")
+
+def _literal_prefix(pattern: str) -> str:
+    """
+    取得正則模式開頭的固定字串（錨點關鍵字）
+    
+    Args:
+        pattern: 正則表達式字串
+        
+    Returns:
+        模式開頭必定出現的字串，無法擷取時返回空字串
+    """
+    # 含有分支（|）的模式不一定以同一段文字開頭
+    if "|" in pattern:
+        return ""
+    
+    prefix = []
+    for char in pattern:
+        if char in _REGEX_META_CHARS:
+            # 後接量詞時，最後一個字元不一定出現（+ 則需與字元一起留在形狀中）
+            if char in "?*+{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+def _is_exact_prefix(pattern: str, prefix: str) -> bool:
+    """
+    確認固定字串確實是模式開頭逐字比對的部分，
+    即「字典樹找到 prefix 後以其餘形狀比對」與 re.search(pattern) 等價
+    
+    Args:
+        pattern: 正則表達式字串
+        prefix: _literal_prefix 擷取的固定字串
+        
+    Returns:
+        是否等價
+    """
+    if not prefix:
+        return True
+    items = list(_sre_parse.parse(pattern, re.IGNORECASE))
+    if len(items) < len(prefix):
+        return False
+    return all(
+        op == _sre_parse.LITERAL and value == ord(char)
+        for (op, value), char in zip(items, prefix)
+    )
 
 class AICommandParser:
     """AI 指令解析器 - 自然語言轉系統指令"""
@@ -19,8 +78,18 @@ class AICommandParser:
         """初始化 AI 指令解析器"""
         self.logger = logging.getLogger(__name__)
         
-        # 指令模板庫 - 核心創新功能
-        self.command_templates = self._load_command_templates()
+        # 解析結果快取 - 重複的自然語言輸入只需一次查表
+        self._parse_cached = functools.lru_cache(maxsize=_PARSE_CACHE_SIZE)(self._parse_sync)
+        
+        # 智能推理用的意圖關鍵字 - 每組關鍵字合併為單一正則表達式
+        self._intent_res = {
+            "file": re.compile("檔案|file|文件"),
+            "show": re.compile("顯示|看|列出|show|list"),
+            "time": re.compile("時間|time|現在|now")
+        }
+        
+        # 指令模板庫 - 核心創新功能（第一次使用時才載入）
+        self._command_templates = None
         
         # 安全指令白名單
         self.safe_commands = {
@@ -29,8 +98,15 @@ class AICommandParser:
             'whoami', 'date', 'time', 'history', 'which', 'where'
         }
         
+    @property
+    def command_templates(self) -> Dict[str, Any]:
+        """指令模板庫，第一次存取時才載入並編譯"""
+        if self._command_templates is None:
+            self._command_templates = self._load_command_templates()
+        return self._command_templates
+    
     def is_ready(self) -> bool:
-        """檢查 AI 解析器是否準備就緒"""
+        """檢查 AI 解析器是否準備就緒（會觸發指令模板載入）"""
         return len(self.command_templates) > 0
     
     def _load_command_templates(self) -> Dict[str, Any]:
@@ -48,6 +124,7 @@ class AICommandParser:
                 ],
                 "command": "mkdir",
                 "args_template": ["{folder_name}"],
+                "arg_builder": lambda groups: [groups[0].strip()],
                 "description": "建立資料夾"
             },
             
@@ -59,8 +136,8 @@ class AICommandParser:
                     r"list.*files?",
                     r"show.*contents?"
                 ],
-                "command": "dir" if self._is_windows() else "ls",
-                "args_template": ["-la"] if not self._is_windows() else [],
+                "command": "dir" if IS_WINDOWS else "ls",
+                "args_template": ["-la"] if not IS_WINDOWS else [],
                 "description": "列出檔案"
             },
             
@@ -74,6 +151,7 @@ class AICommandParser:
                 ],
                 "command": "cd",
                 "args_template": ["{directory}"],
+                "arg_builder": lambda groups: [groups[0].strip() or "."],
                 "description": "切換目錄"
             },
             
@@ -83,8 +161,9 @@ class AICommandParser:
                     r"拷貝.*([^\s]+).*到.*([^\s]+)",
                     r"copy.*([^\s]+).*to.*([^\s]+)"
                 ],
-                "command": "copy" if self._is_windows() else "cp",
+                "command": "copy" if IS_WINDOWS else "cp",
                 "args_template": ["{source}", "{destination}"],
+                "arg_builder": lambda groups: [groups[0].strip(), groups[1].strip()],
                 "description": "複製檔案"
             },
             
@@ -94,8 +173,9 @@ class AICommandParser:
                     r"搬移.*([^\s]+).*到.*([^\s]+)",
                     r"move.*([^\s]+).*to.*([^\s]+)"
                 ],
-                "command": "move" if self._is_windows() else "mv",
+                "command": "move" if IS_WINDOWS else "mv",
                 "args_template": ["{source}", "{destination}"],
+                "arg_builder": lambda groups: [groups[0].strip(), groups[1].strip()],
                 "description": "移動檔案"
             },
             
@@ -109,7 +189,7 @@ class AICommandParser:
                     r"current.*directory",
                     r"where.*am.*i"
                 ],
-                "command": "cd" if self._is_windows() else "pwd",
+                "command": "cd" if IS_WINDOWS else "pwd",
                 "args_template": [],
                 "description": "顯示當前目錄"
             },
@@ -122,7 +202,7 @@ class AICommandParser:
                     r"disk.*usage",
                     r"free.*space"
                 ],
-                "command": "dir /-c" if self._is_windows() else "df -h",
+                "command": "dir /-c" if IS_WINDOWS else "df -h",
                 "args_template": [],
                 "description": "顯示磁碟使用情況"
             },
@@ -135,55 +215,162 @@ class AICommandParser:
                     r"system.*info",
                     r"computer.*info"
                 ],
-                "command": "systeminfo" if self._is_windows() else "uname -a",
+                "command": "systeminfo" if IS_WINDOWS else "uname -a",
                 "args_template": [],
                 "description": "顯示系統資訊"
             }
         }
         
-        self.logger.info(f"載入了 {len(templates)} 個指令模板")
+        # 沒有參數化的模板直接使用固定參數
+        for template in templates.values():
+            template.setdefault(
+                "arg_builder",
+                lambda groups, args=tuple(template["args_template"]): list(args)
+            )
+        
+        self._compile_patterns(templates)
+        
+        # 模板變更後舊的解析結果不再有效
+        self._parse_cached.cache_clear()
+        
+        self.logger.info(f"載入了 {len(templates)} 個指令模板，"
+                         f"共 {len(self._shapes)} 種模式形狀")
         return templates
     
-    def _is_windows(self) -> bool:
+    def _compile_patterns(self, templates: Dict[str, Any]):
+        """
+        編譯模板模式
+        
+        每個模式拆成「開頭固定字串」與「其餘形狀」：許多模式共用相同形狀
+        （例如 .*([^\\s]+).*到.*([^\\s]+)），形狀只編譯一次；固定字串放入字典樹，
+        解析時走訪字典樹找到候選位置，再以形狀正則從該位置比對並取出參數。
+        沒有固定開頭的模式放在字典樹根節點，於每個位置都成為候選。
+        
+        Args:
+            templates: 指令模板庫
+        """
+        # 依模板順序排列的模式分支：(指令鍵值, 模板, 固定開頭, 形狀正則)
+        self._alternatives = []
+        self._shapes = {}
+        self._anchor_trie = {}
+        
+        for command_key, template in templates.items():
+            for pattern in template["patterns"]:
+                prefix = _literal_prefix(pattern)
+                if not _is_exact_prefix(pattern, prefix):
+                    self.logger.warning(f"模式開頭無法作為固定字串，改為逐位置比對: {pattern}")
+                    prefix = ""
+                shape_source = pattern[len(prefix):]
+                shape = self._shapes.get(shape_source)
+                if shape is None:
+                    shape = self._shapes[shape_source] = re.compile(shape_source, re.IGNORECASE)
+                
+                index = len(self._alternatives)
+                prefix = prefix.casefold()
+                self._alternatives.append((command_key, template, prefix, shape))
+                
+                node = self._anchor_trie
+                for char in prefix:
+                    node = node.setdefault(char, {})
+                node.setdefault("", []).append(index)
+    
+    def _match_template(self, text: str) -> Optional[Tuple[str, Dict[str, Any], Tuple[str, ...]]]:
+        """
+        找出第一個（依模板順序）匹配的模式
+        
+        Args:
+            text: 已正規化的文字
+            
+        Returns:
+            (指令鍵值, 模板, 擷取群組)，沒有匹配時返回 None
+        """
+        # 走訪字典樹，找出所有固定開頭出現的位置：(分支索引, 形狀比對起點)
+        candidates = []
+        for start in range(len(text) + 1):
+            node = self._anchor_trie
+            position = start
+            while True:
+                if "" in node:
+                    candidates.extend((index, position) for index in node[""])
+                if position == len(text):
+                    break
+                node = node.get(text[position])
+                if node is None:
+                    break
+                position += 1
+        
+        # 依模板順序、再依出現位置（等同 search() 的最左匹配）逐一比對形狀
+        for index, position in sorted(candidates):
+            match = self._alternatives[index][3].match(text, position)
+            if match:
+                command_key, template, _, _ = self._alternatives[index]
+                return command_key, template, match.groups()
+        return None
+    
+    @staticmethod
+    def _is_windows() -> bool:
         """檢查是否為 Windows 系統"""
-        import platform
-        return platform.system().lower() == 'windows'
+        return IS_WINDOWS
     
-    async def parse_natural_language(self, text: str) -> Optional[Dict[str, Any]]:
+    def parse_natural_language(self, text: str,
+                               text_norm: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         核心功能：將自然語言轉換為系統指令
         
         Args:
             text: 自然語言輸入
+            text_norm: 呼叫端已正規化（strip + casefold）的文字，None 時自行正規化
             
         Returns:
             解析後的指令資訊，包含指令、參數、描述等
         """
-        if not text or not text.strip():
+        if text_norm is None:
+            text_norm = text.strip().casefold() if text else ""
+        if not text_norm:
             return None
+        
+        # 以正規化文字查詢快取，並複製結果避免呼叫端修改快取內容
+        result = self._parse_cached(text_norm)
+        if result is None:
+            return None
+        result = dict(result)
+        result["args"] = list(result["args"])
+        return result
+    
+    def _parse_sync(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        解析已正規化的自然語言（結果由 LRU 快取保存）
+        
+        Args:
+            text: 已去除空白並經過 casefold 的自然語言
             
-        text = text.strip().lower()
+        Returns:
+            解析後的指令資訊
+        """
         self.logger.info(f"🧠 解析自然語言: {text}")
         
-        # 遍歷所有指令模板進行匹配
-        for command_key, template in self.command_templates.items():
-            for pattern in template["patterns"]:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    return await self._build_command(command_key, template, match, text)
+        # 存取 command_templates 會在第一次解析時載入模板
+        if not self.command_templates:
+            return self._intelligent_parse(text)
+        
+        # 以字典樹與共用形狀正則比對所有模板
+        matched = self._match_template(text)
+        if matched:
+            command_key, template, groups = matched
+            return self._build_command(command_key, template, groups, text)
         
         # 如果沒有匹配到預定義模板，嘗試智能推理
-        return await self._intelligent_parse(text)
+        return self._intelligent_parse(text)
     
-    async def _build_command(self, command_key: str, template: Dict[str, Any], 
-                           match: re.Match, original_text: str) -> Dict[str, Any]:
+    def _build_command(self, command_key: str, template: Dict[str, Any], 
+                       groups: Tuple[str, ...], original_text: str) -> Dict[str, Any]:
         """
         根據模板和匹配結果建構指令
         
         Args:
             command_key: 指令鍵值
             template: 指令模板
-            match: 正則匹配結果
+            groups: 匹配模式的擷取群組
             original_text: 原始文字
             
         Returns:
@@ -191,38 +378,17 @@ class AICommandParser:
         """
         command_info = {
             "command": template["command"],
-            "args": [],
+            # 參數由載入模板時建立的 arg_builder 產生
+            "args": template["arg_builder"](groups),
             "description": template["description"],
             "original_text": original_text,
             "command_key": command_key
         }
         
-        # 處理參數
-        if "args_template" in template and template["args_template"]:
-            args = []
-            for i, arg_template in enumerate(template["args_template"]):
-                if "{" in arg_template:
-                    # 參數化處理
-                    if command_key == "create_folder":
-                        folder_name = match.group(1) if match.groups() else "新資料夾"
-                        args.append(folder_name.strip())
-                    elif command_key == "change_directory":
-                        directory = match.group(1) if match.groups() else "."
-                        args.append(directory.strip())
-                    elif command_key in ["copy_file", "move_file"]:
-                        if len(match.groups()) >= 2:
-                            args.extend([match.group(1).strip(), match.group(2).strip()])
-                else:
-                    args.append(arg_template)
-            
-            command_info["args"] = args
-        else:
-            command_info["args"] = template.get("args_template", [])
-        
         self.logger.info(f"✅ 成功解析指令: {command_info}")
         return command_info
     
-    async def _intelligent_parse(self, text: str) -> Optional[Dict[str, Any]]:
+    def _intelligent_parse(self, text: str) -> Optional[Dict[str, Any]]:
         """
         智能解析 - 處理未預定義的自然語言
         這裡可以整合更進階的 NLP 模型或 LLM
@@ -236,19 +402,19 @@ class AICommandParser:
         self.logger.info(f"🤖 嘗試智能推理: {text}")
         
         # 簡單的關鍵字推理邏輯
-        if any(keyword in text for keyword in ["檔案", "file", "文件"]):
-            if any(keyword in text for keyword in ["顯示", "看", "列出", "show", "list"]):
+        if self._intent_res["file"].search(text):
+            if self._intent_res["show"].search(text):
                 return {
-                    "command": "dir" if self._is_windows() else "ls",
+                    "command": "dir" if IS_WINDOWS else "ls",
                     "args": [],
                     "description": "列出檔案（智能推理）",
                     "original_text": text,
                     "command_key": "intelligent_list_files"
                 }
         
-        if any(keyword in text for keyword in ["時間", "time", "現在", "now"]):
+        if self._intent_res["time"].search(text):
             return {
-                "command": "date" if not self._is_windows() else "echo %date% %time%",
+                "command": "date" if not IS_WINDOWS else "echo %date% %time%",
                 "args": [],
                 "description": "顯示時間（智能推理）",
                 "original_text": text,
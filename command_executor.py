@@ -6,35 +6,162 @@
 """
 
 import subprocess
+import codecs
+import locale
 import logging
 import asyncio
 import os
+import signal
 import shlex
-from typing import Dict, Any, List, Optional
-import platform
+import secrets
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple, Callable
+import re
+import shutil
+from config import Config, IS_WINDOWS
+
+# 可選的多模式字串比對加速
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Numba 匯入成本較高，只在啟用 JIT 安全掃描時載入
+NUMBA_AVAILABLE = False
+if Config.ENABLE_JIT_SAFETY_SCAN:
+    try:
+        import numpy as np
+        from numba import njit
+        NUMBA_AVAILABLE = True
+    except ImportError:
+        pass
+
+# 必須透過 shell 執行的內建指令（沒有對應的執行檔）
+if IS_WINDOWS:
+    _SHELL_BUILTINS = frozenset({
+        'dir', 'copy', 'move', 'echo', 'type', 'cls', 'cd', 'mkdir', 'md',
+        'date', 'time', 'ver', 'set'
+    })
+else:
+    _SHELL_BUILTINS = frozenset({'history'})
+
+# 指令輸出編碼（Windows 主控台使用系統語系編碼，例如 cp950）
+_OUTPUT_ENCODING = locale.getpreferredencoding(False) if IS_WINDOWS else 'utf-8'
+
+# 每次從管線讀取的位元組數
+_READ_CHUNK_SIZE = 4096
+
+# 輸出超過 MAX_OUTPUT_LENGTH 時附加的提示
+_TRUNCATED_NOTICE = "\n...（輸出過長，已截斷）"
+
+# 常駐 shell 用來標記指令輸出結束的字串前綴（每次執行再加上隨機值，避免與指令輸出衝突）
+_SHELL_SENTINEL = "___END_"
+
+# 參數中的危險模式
+_DANGEROUS_PATTERNS = (
+    '..', '~', '/', '\\', '|', '&', ';', '>', '<', '*', '?',
+    'system32', 'etc', 'root', 'admin'
+)
+_DANGEROUS_RE = re.compile('|'.join(map(re.escape, _DANGEROUS_PATTERNS)))
+
+if NUMBA_AVAILABLE:
+    # 危險模式攤平成單一位元組陣列，以 offsets 標示每個模式的起訖位置
+    _PATTERN_BYTES = np.frombuffer(
+        b''.join(pattern.encode('utf-8') for pattern in _DANGEROUS_PATTERNS), dtype=np.uint8
+    )
+    _PATTERN_OFFSETS = np.cumsum(
+        [0] + [len(pattern.encode('utf-8')) for pattern in _DANGEROUS_PATTERNS]
+    ).astype(np.int64)
+    
+    @njit(cache=True)
+    def _scan_dangerous_bytes(buf, patterns, offsets):
+        """以位元組迴圈比對 UTF-8 文字中是否出現任一危險模式（Numba 編譯）"""
+        size = buf.shape[0]
+        for p in range(offsets.shape[0] - 1):
+            start = offsets[p]
+            length = offsets[p + 1] - start
+            for i in range(size - length + 1):
+                matched = True
+                for j in range(length):
+                    if buf[i + j] != patterns[start + j]:
+                        matched = False
+                        break
+                if matched:
+                    return True
+        return False
+
+def _build_danger_hyperscan_db():
+    """建立危險模式的 Hyperscan 資料庫，無法使用 Hyperscan 時返回 None"""
+    if not HYPERSCAN_AVAILABLE:
+        return None
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[re.escape(pattern).encode('utf-8') for pattern in _DANGEROUS_PATTERNS],
+            ids=list(range(len(_DANGEROUS_PATTERNS))),
+            elements=len(_DANGEROUS_PATTERNS),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_DANGEROUS_PATTERNS)
+        )
+        return database
+    except Exception:
+        return None
+
+def _build_danger_automaton():
+    """建立危險模式的 Aho-Corasick 自動機，未安裝 pyahocorasick 時返回 None"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for pattern in _DANGEROUS_PATTERNS:
+        automaton.add_word(pattern, pattern)
+    automaton.make_automaton()
+    return automaton
+
+class CommandResult(NamedTuple):
+    """指令執行結果"""
+    success: bool
+    output: str
+    error: str
+    command: str
+    return_code: int
+    truncated: bool = False  # 輸出超過 MAX_OUTPUT_LENGTH 而被截斷
 
 class CommandExecutor:
     """系統指令執行器"""
     
+    # 危險指令黑名單
+    DANGEROUS_COMMANDS = frozenset({
+        'rm', 'del', 'format', 'fdisk', 'mkfs', 'dd', 'shutdown', 'reboot',
+        'halt', 'poweroff', 'init', 'kill', 'killall', 'pkill', 'sudo',
+        'su', 'chmod', 'chown', 'passwd', 'useradd', 'userdel', 'usermod'
+    })
+    
+    # 允許的安全指令
+    SAFE_COMMANDS = frozenset({
+        'ls', 'dir', 'pwd', 'cd', 'mkdir', 'echo', 'cat', 'type', 'find',
+        'grep', 'ps', 'top', 'df', 'du', 'free', 'whoami', 'date', 'time',
+        'history', 'which', 'where', 'systeminfo', 'uname', 'copy', 'cp',
+        'move', 'mv', 'tree', 'cls', 'clear'
+    })
+    
+    # 危險模式比對引擎 - 單次線性掃描即可找出所有危險模式
+    # 依序優先使用 Hyperscan、Aho-Corasick 自動機，最後為合併的正則表達式
+    _DANGER_HS = _build_danger_hyperscan_db()
+    _DANGER_AC = _build_danger_automaton()
+    
     def __init__(self):
         """初始化指令執行器"""
         self.logger = logging.getLogger(__name__)
-        self.is_windows = platform.system().lower() == 'windows'
+        self.is_windows = IS_WINDOWS
         
-        # 危險指令黑名單
-        self.dangerous_commands = {
-            'rm', 'del', 'format', 'fdisk', 'mkfs', 'dd', 'shutdown', 'reboot',
-            'halt', 'poweroff', 'init', 'kill', 'killall', 'pkill', 'sudo',
-            'su', 'chmod', 'chown', 'passwd', 'useradd', 'userdel', 'usermod'
-        }
-        
-        # 允許的安全指令
-        self.safe_commands = {
-            'ls', 'dir', 'pwd', 'cd', 'mkdir', 'echo', 'cat', 'type', 'find',
-            'grep', 'ps', 'top', 'df', 'du', 'free', 'whoami', 'date', 'time',
-            'history', 'which', 'where', 'systeminfo', 'uname', 'copy', 'cp',
-            'move', 'mv', 'tree', 'cls', 'clear'
-        }
+        # 常駐 shell（啟用 ENABLE_PERSISTENT_SHELL 時於第一次執行指令時建立）
+        self._shell = None
+        self._shell_lock = asyncio.Lock()
         
     def is_ready(self) -> bool:
         """檢查執行器是否準備就緒"""
@@ -50,18 +177,18 @@ class CommandExecutor:
         Returns:
             是否為安全指令
         """
-        command = command_info.get("command", "").lower()
+        command = command_info.get("command", "").casefold()
         
         # 檢查基礎指令名稱
         base_command = command.split()[0] if ' ' in command else command
         
         # 危險指令檢查
-        if base_command in self.dangerous_commands:
+        if base_command in self.DANGEROUS_COMMANDS:
             self.logger.warning(f"🚨 危險指令被阻止: {command}")
             return False
         
         # 白名單檢查
-        if base_command not in self.safe_commands:
+        if base_command not in self.SAFE_COMMANDS:
             self.logger.warning(f"⚠️ 不在安全清單中的指令: {command}")
             return False
         
@@ -76,18 +203,27 @@ class CommandExecutor:
     
     def _contains_dangerous_patterns(self, text: str) -> bool:
         """檢查文字中是否包含危險模式"""
-        dangerous_patterns = [
-            '..', '~', '/', '\\', '|', '&', ';', '>', '<', '*', '?',
-            'system32', 'etc', 'root', 'admin'
-        ]
-        
-        text_lower = text.lower()
-        for pattern in dangerous_patterns:
-            if pattern in text_lower:
+        text_norm = text.casefold()
+        if NUMBA_AVAILABLE:
+            return _scan_dangerous_bytes(
+                np.frombuffer(text_norm.encode('utf-8'), dtype=np.uint8),
+                _PATTERN_BYTES, _PATTERN_OFFSETS
+            )
+        if self._DANGER_HS is not None:
+            # 找到第一個危險模式即中止掃描（回呼返回 True 會觸發 ScanTerminated）
+            try:
+                self._DANGER_HS.scan(
+                    text_norm.encode('utf-8'),
+                    match_event_handler=lambda pattern_id, start, end, flags, context: True
+                )
+            except hyperscan.ScanTerminated:
                 return True
-        return False
+            return False
+        if self._DANGER_AC is not None:
+            return next(self._DANGER_AC.iter(text_norm), None) is not None
+        return _DANGEROUS_RE.search(text_norm) is not None
     
-    async def execute(self, command_info: Dict[str, Any]) -> Dict[str, Any]:
+    async def execute(self, command_info: Dict[str, Any]) -> CommandResult:
         """
         執行指令
         
@@ -109,103 +245,348 @@ class CommandExecutor:
             
             self.logger.info(f"⚡ 執行指令: {full_command}")
             
-            # 特殊指令處理
-            if command.lower() == "cd":
-                return await self._handle_cd_command(args)
-            
-            # 執行指令
-            result = await self._run_command(full_command)
+            if Config.ENABLE_PERSISTENT_SHELL:
+                # 常駐 shell 會自行保留 cd 後的目錄
+                result = await self._run_in_shell(command, args)
+            else:
+                # 特殊指令處理
+                if command.lower() == "cd":
+                    return await self._handle_cd_command(args)
+                
+                # 執行指令
+                result = await self._run_command(command, args)
             
-            if result["success"]:
+            if result.success:
                 self.logger.info(f"✅ 指令執行成功")
             else:
-                self.logger.error(f"❌ 指令執行失敗: {result['error']}")
+                self.logger.error(f"❌ 指令執行失敗: {result.error}")
             
             return result
             
         except Exception as e:
             error_msg = f"執行指令時發生錯誤: {e}"
             self.logger.error(error_msg)
-            return {
-                "success": False,
-                "error": error_msg,
-                "output": "",
-                "command": command_info.get("command", "")
-            }
+            return CommandResult(
+                success=False,
+                error=error_msg,
+                output="",
+                command=command_info.get("command", ""),
+                return_code=-1
+            )
     
-    async def _run_command(self, command: str) -> Dict[str, Any]:
+    async def _run_command(self, command: str, args: List[str]) -> CommandResult:
         """
         執行系統指令
         
         Args:
-            command: 要執行的指令
+            command: 要執行的指令（可包含固定參數，例如 "df -h"）
+            args: 指令參數
             
         Returns:
             執行結果
         """
+        argv = shlex.split(command, posix=not self.is_windows) + list(args)
+        if not argv:
+            return self._empty_command_result()
+        command = " ".join(argv)
+        
         try:
-            # Windows 和 Unix 系統的處理
-            if self.is_windows:
-                # Windows 使用 cmd
+            if argv[0].lower() in _SHELL_BUILTINS:
+                # shell 內建指令仍需透過 cmd / sh 執行
+                if self.is_windows:
+                    command_line = subprocess.list2cmdline(argv)
+                else:
+                    command_line = shlex.join(argv)
                 process = await asyncio.create_subprocess_shell(
-                    command,
+                    command_line,
                     stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    shell=True
+                    stderr=asyncio.subprocess.PIPE
                 )
             else:
-                # Unix 系統使用 bash
-                process = await asyncio.create_subprocess_shell(
-                    command,
+                # 直接執行程式，省去啟動 shell 的成本，也避免 shell 注入
+                process = await asyncio.create_subprocess_exec(
+                    *argv,
                     stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    shell=True
+                    stderr=asyncio.subprocess.PIPE
                 )
             
-            # 等待指令完成並獲取輸出
-            stdout, stderr = await process.communicate()
+            # 輸出過長時終止指令；記錄是否由我們送出 kill，此時的結束碼並非指令本身產生
+            killed = []
             
-            # 解碼輸出
-            if self.is_windows:
-                # Windows 可能使用不同編碼
+            def stop():
+                if process.returncode is None:
+                    try:
+                        process.kill()
+                        killed.append(True)
+                    except ProcessLookupError:
+                        pass
+            
+            async def communicate():
+                outputs = await asyncio.gather(
+                    self._read_output(process.stdout, stop),
+                    self._read_output(process.stderr, stop)
+                )
+                # 指令關閉管線後仍可能繼續執行，等待結束也必須受時限約束
+                await process.wait()
+                return outputs
+            
+            # 邊讀取邊解碼輸出，超過長度上限時提前終止指令，超過時限則強制結束
+            try:
+                (stdout_text, stdout_truncated), (stderr_text, stderr_truncated) = await asyncio.wait_for(
+                    communicate(),
+                    timeout=Config.COMMAND_TIMEOUT
+                )
+            except asyncio.TimeoutError:
                 try:
-                    stdout_text = stdout.decode('utf-8')
-                    stderr_text = stderr.decode('utf-8')
-                except UnicodeDecodeError:
-                    stdout_text = stdout.decode('cp950', errors='ignore')
-                    stderr_text = stderr.decode('cp950', errors='ignore')
-            else:
-                stdout_text = stdout.decode('utf-8')
-                stderr_text = stderr.decode('utf-8')
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+                return self._timeout_result(command)
+            
+            stdout_text = stdout_text.strip()
+            stderr_text = stderr_text.strip()
+            if stdout_truncated:
+                stdout_text += _TRUNCATED_NOTICE
+            if stderr_truncated:
+                stderr_text += _TRUNCATED_NOTICE
             
-            # 處理結果
-            if process.returncode == 0:
-                return {
-                    "success": True,
-                    "output": stdout_text.strip(),
-                    "error": "",
-                    "command": command,
-                    "return_code": process.returncode
-                }
+            if killed:
+                # 被截斷而終止的指令沒有自己的結束碼：以 -1 標示，
+                # 並以終止前是否輸出錯誤訊息判斷成功與否
+                return_code = -1
+                success = not stderr_text
             else:
-                return {
-                    "success": False,
-                    "output": stdout_text.strip(),
-                    "error": stderr_text.strip(),
-                    "command": command,
-                    "return_code": process.returncode
-                }
+                return_code = process.returncode
+                success = return_code == 0
+            
+            return CommandResult(
+                success=success,
+                output=stdout_text,
+                error="" if success else stderr_text,
+                command=command,
+                return_code=return_code,
+                truncated=stdout_truncated or stderr_truncated
+            )
                 
         except Exception as e:
-            return {
-                "success": False,
-                "output": "",
-                "error": str(e),
-                "command": command,
-                "return_code": -1
-            }
+            return CommandResult(
+                success=False,
+                output="",
+                error=str(e),
+                command=command,
+                return_code=-1
+            )
     
-    async def _handle_cd_command(self, args: List[str]) -> Dict[str, Any]:
+    async def _read_output(self, stream: asyncio.StreamReader,
+                           stop: Callable[[], None]) -> Tuple[str, bool]:
+        """
+        逐段讀取並解碼指令輸出，超過 MAX_OUTPUT_LENGTH 時終止指令
+        
+        Args:
+            stream: 指令的 stdout 或 stderr
+            stop: 輸出過長時呼叫，用來終止指令
+            
+        Returns:
+            (解碼後的文字, 是否被截斷)
+        """
+        decoder = codecs.getincrementaldecoder(_OUTPUT_ENCODING)(errors='replace')
+        parts = []
+        length = 0
+        
+        while True:
+            chunk = await stream.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            text = decoder.decode(chunk)
+            parts.append(text)
+            length += len(text)
+            if length > Config.MAX_OUTPUT_LENGTH:
+                stop()
+                return "".join(parts)[:Config.MAX_OUTPUT_LENGTH], True
+        
+        parts.append(decoder.decode(b'', final=True))
+        return "".join(parts), False
+    
+    async def _ensure_shell(self):
+        """取得常駐 shell，尚未啟動或已結束時重新建立"""
+        if self._shell is None or self._shell.returncode is not None:
+            if self.is_windows:
+                argv = ["cmd.exe", "/Q", "/K"]
+                options = {}
+            else:
+                argv = [shutil.which("bash") or "/bin/sh", "-s"]
+                # 獨立的程序群組，逾時時可連同子程序一併結束
+                options = {"start_new_session": True}
+            self.logger.info(f"🐚 啟動常駐 shell: {' '.join(argv)}")
+            self._shell = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                **options
+            )
+        return self._shell
+    
+    async def _run_in_shell(self, command: str, args: List[str]) -> CommandResult:
+        """
+        在常駐 shell 中執行指令，省去每個指令啟動新程序的成本
+        
+        Args:
+            command: 要執行的指令（可包含固定參數，例如 "df -h"）
+            args: 指令參數
+            
+        Returns:
+            執行結果（stderr 會合併到輸出中）
+        """
+        argv = shlex.split(command, posix=not self.is_windows) + list(args)
+        if not argv:
+            return self._empty_command_result()
+        command = " ".join(argv)
+        
+        # 指令的標準輸入改接空裝置，只有 shell 本身讀取管線，
+        # 避免 cat、sort 等讀取 stdin 的指令吃掉後面的結束標記
+        sentinel = f"{_SHELL_SENTINEL}{secrets.token_hex(8)}___"
+        if self.is_windows:
+            command_line = f"{subprocess.list2cmdline(argv)} <NUL"
+            end_marker = f"echo {sentinel}%errorlevel%"
+        else:
+            command_line = f"{shlex.join(argv)} </dev/null"
+            end_marker = f"echo {sentinel}$?"
+        
+        try:
+            async with self._shell_lock:
+                shell = await self._ensure_shell()
+                try:
+                    shell.stdin.write(f"{command_line}\n{end_marker}\n".encode())
+                    await shell.stdin.drain()
+                    
+                    output_text, return_code, truncated = await asyncio.wait_for(
+                        self._read_shell_output(shell, sentinel.encode()),
+                        timeout=Config.COMMAND_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    await self._discard_shell(shell)
+                    return self._timeout_result(command)
+                except Exception:
+                    await self._discard_shell(shell)
+                    raise
+            
+            return CommandResult(
+                success=return_code == 0,
+                output=output_text,
+                error="" if return_code == 0 else output_text,
+                command=command,
+                return_code=return_code,
+                truncated=truncated
+            )
+            
+        except Exception as e:
+            return CommandResult(
+                success=False,
+                output="",
+                error=str(e),
+                command=command,
+                return_code=-1
+            )
+    
+    async def _read_shell_output(self, shell: asyncio.subprocess.Process, sentinel: bytes) -> Tuple[str, int, bool]:
+        """
+        讀取常駐 shell 的輸出直到結束標記，標記後方為指令的結束碼
+        以固定大小分塊讀取（不受單行長度限制）；超過長度上限的輸出直接丟棄
+        （shell 需保留，因此不終止程序）
+        
+        Args:
+            shell: 常駐 shell 程序
+            sentinel: 本次執行的結束標記
+            
+        Returns:
+            (輸出文字, 結束碼, 是否被截斷)
+        """
+        decoder = codecs.getincrementaldecoder(_OUTPUT_ENCODING)(errors='replace')
+        parts = []
+        length = 0
+        buffer = b""
+        # 保留可能是被分塊切開的標記開頭，留待與下一塊合併比對
+        keep = len(sentinel) - 1
+        
+        while True:
+            chunk = await shell.stdout.read(_READ_CHUNK_SIZE)
+            if not chunk:
+                raise RuntimeError("常駐 shell 已意外結束")
+            buffer += chunk
+            
+            index = buffer.find(sentinel)
+            if index >= 0:
+                newline = buffer.find(b"\n", index)
+                if newline < 0:
+                    # 結束碼尚未完整讀入
+                    continue
+                try:
+                    return_code = int(buffer[index + len(sentinel):newline].strip())
+                except ValueError:
+                    # 標記後方不是數字（標記遭指令輸出干擾），無法得知結束碼
+                    return_code = -1
+                data, buffer = buffer[:index], b""
+            elif len(buffer) > keep:
+                data, buffer = buffer[:-keep], buffer[-keep:]
+            else:
+                continue
+            
+            if length <= Config.MAX_OUTPUT_LENGTH:
+                text = decoder.decode(data)
+                parts.append(text)
+                length += len(text)
+            if index >= 0:
+                break
+        
+        output_text = "".join(parts).strip()
+        truncated = length > Config.MAX_OUTPUT_LENGTH
+        if truncated:
+            output_text = output_text[:Config.MAX_OUTPUT_LENGTH] + _TRUNCATED_NOTICE
+        return output_text, return_code, truncated
+    
+    async def _discard_shell(self, shell: asyncio.subprocess.Process):
+        """
+        丟棄狀態不明的常駐 shell（逾時或讀取失敗時可能仍有未讀的輸出），
+        下次執行時重新建立
+        """
+        self._kill_shell(shell)
+        await shell.wait()
+        self._shell = None
+    
+    def _kill_shell(self, shell: asyncio.subprocess.Process):
+        """結束常駐 shell 以及仍在執行的子程序"""
+        try:
+            if self.is_windows:
+                shell.kill()
+            else:
+                os.killpg(shell.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    
+    def _timeout_result(self, command: str) -> CommandResult:
+        """建立指令逾時的執行結果"""
+        self.logger.warning(f"⏱️ 指令執行超時: {command}")
+        return CommandResult(
+            success=False,
+            output="",
+            error=f"指令執行超時（{Config.COMMAND_TIMEOUT} 秒）",
+            command=command,
+            return_code=-1
+        )
+    
+    def _empty_command_result(self) -> CommandResult:
+        """建立空白指令的執行結果"""
+        return CommandResult(
+            success=False,
+            output="",
+            error="指令為空白",
+            command="",
+            return_code=-1
+        )
+    
+    async def _handle_cd_command(self, args: List[str]) -> CommandResult:
         """
         特殊處理 cd 指令（因為需要改變當前目錄）
         
@@ -219,52 +600,52 @@ class CommandExecutor:
             if not args:
                 # 沒有參數，顯示當前目錄
                 current_dir = os.getcwd()
-                return {
-                    "success": True,
-                    "output": f"目前目錄: {current_dir}",
-                    "error": "",
-                    "command": "cd",
-                    "return_code": 0
-                }
+                return CommandResult(
+                    success=True,
+                    output=f"目前目錄: {current_dir}",
+                    error="",
+                    command="cd",
+                    return_code=0
+                )
             
             target_dir = args[0]
             
             # 檢查目標目錄是否存在
             if not os.path.exists(target_dir):
-                return {
-                    "success": False,
-                    "output": "",
-                    "error": f"目錄不存在: {target_dir}",
-                    "command": f"cd {target_dir}",
-                    "return_code": 1
-                }
+                return CommandResult(
+                    success=False,
+                    output="",
+                    error=f"目錄不存在: {target_dir}",
+                    command=f"cd {target_dir}",
+                    return_code=1
+                )
             
             # 切換目錄
             os.chdir(target_dir)
             new_dir = os.getcwd()
             
-            return {
-                "success": True,
-                "output": f"已切換到: {new_dir}",
-                "error": "",
-                "command": f"cd {target_dir}",
-                "return_code": 0
-            }
+            return CommandResult(
+                success=True,
+                output=f"已切換到: {new_dir}",
+                error="",
+                command=f"cd {target_dir}",
+                return_code=0
+            )
             
         except Exception as e:
-            return {
-                "success": False,
-                "output": "",
-                "error": f"切換目錄失敗: {e}",
-                "command": f"cd {' '.join(args) if args else ''}",
-                "return_code": 1
-            }
+            return CommandResult(
+                success=False,
+                output="",
+                error=f"切換目錄失敗: {e}",
+                command=f"cd {' '.join(args) if args else ''}",
+                return_code=1
+            )
     
     def get_current_directory(self) -> str:
         """取得當前工作目錄"""
         return os.getcwd()
     
-    def format_output(self, result: Dict[str, Any]) -> str:
+    def format_output(self, result: CommandResult) -> str:
         """
         格式化輸出結果
         
@@ -274,12 +655,21 @@ class CommandExecutor:
         Returns:
             格式化後的文字
         """
-        if result["success"]:
-            output = result["output"]
+        if result.success:
+            output = result.output
             if output:
                 return f"執行結果：\n{output}"
             else:
                 return "指令執行完成"
         else:
-            error = result["error"]
+            error = result.error
             return f"執行失敗：{error}"
+    
+    def __del__(self):
+        """清理資源"""
+        shell = getattr(self, '_shell', None)
+        if shell is not None and shell.returncode is None:
+            try:
+                self._kill_shell(shell)
+            except:
+                pass
@@ -6,8 +6,12 @@ Voice AI Shell 的所有設定參數
 """
 
 import logging
+import platform
 from pathlib import Path
 
+# 作業系統判斷只需在載入模組時執行一次（指令解析與執行共用）
+IS_WINDOWS = platform.system().lower() == 'windows'
+
 class Config:
     """配置設定類"""
     
@@ -25,10 +29,27 @@ class Config:
     RECORD_DURATION = 5  # 錄音時長（秒）
     SAMPLE_RATE = 16000  # 取樣率
     
+    # 語音輸出設定
+    TTS_BACKEND = "piper"  # piper（低延遲）或 xtts（高品質），無法使用時依序改用 piper → xtts → pyttsx3
+    PIPER_VOICE = "voices/zh_CN-huayan-medium.onnx"  # Piper 語音模型（相對於專案目錄）
+    
     # XTTS 語音輸出設定
     XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
     XTTS_SPEAKER = "zh-cn-female-1"  # 預設說話者
     XTTS_LANGUAGE = "zh"  # 中文
+    XTTS_WARMUP = True  # 載入模型後先合成一句短語暖機
+    
+    # 啟動時預先合成的固定語句（以標點或空白結尾者也作為前綴使用）
+    CANNED_PHRASES = [
+        "收到",
+        "指令執行中",
+        "指令執行成功。",
+        "指令執行失敗: ",
+        "我沒有聽清楚，請再說一次",
+        "我不知道如何執行這個指令",
+        "這個指令可能不安全，我無法執行",
+        "處理指令時發生錯誤"
+    ]
     
     # 備用 TTS 設定
     FALLBACK_TTS_RATE = 150  # 語速
@@ -37,10 +58,12 @@ class Config:
     # 指令執行設定
     COMMAND_TIMEOUT = 30  # 指令執行超時（秒）
     ENABLE_COMMAND_LOGGING = True  # 啟用指令日誌
+    ENABLE_PERSISTENT_SHELL = False  # 使用常駐 shell 執行指令（cd 會保留在 shell 中）
     
     # 安全設定
     ENABLE_SAFETY_CHECK = True  # 啟用安全檢查
     ALLOW_DANGEROUS_COMMANDS = False  # 是否允許危險指令
+    ENABLE_JIT_SAFETY_SCAN = False  # 以 Numba JIT 掃描危險參數（需安裝 numba，適合大量執行指令的伺服器模式）
     
     # 檔案路徑設定
     BASE_DIR = Path(__file__).parent
@@ -121,9 +121,12 @@ class FullAIShell:
         try:
             print(f"\n🎤 語音識別模擬: {text}")
             
+            # 在入口正規化一次，作為解析器的輸入與快取鍵值
+            text_norm = text.strip().casefold()
+            
             # 1. AI 指令解析
             print("🧠 AI 指令解析中...")
-            command_info = await self.ai_parser.parse_natural_language(text)
+            command_info = self.ai_parser.parse_natural_language(text, text_norm)
             
             if not command_info:
                 message = "我不知道如何執行這個指令"
@@ -148,12 +151,12 @@ class FullAIShell:
             result = await self.command_executor.execute(command_info)
             
             # 4. 處理結果和語音回饋
-            if result['success']:
+            if result.success:
                 message = "指令執行成功"
                 print(f"✅ {message}")
                 
-                if result['output']:
-                    print(f"📄 執行結果:\n{result['output']}")
+                if result.output:
+                    print(f"📄 執行結果:\n{result.output}")
                     # 對於有輸出的指令，提供更具體的回饋
                     if 'dir' in command_info['command'].lower() or 'ls' in command_info['command'].lower():
                         message = "檔案列表已顯示"
@@ -164,7 +167,7 @@ class FullAIShell:
                     else:
                         message = "指令執行完成"
             else:
-                message = f"指令執行失敗: {result.get('error', '未知錯誤')}"
+                message = f"指令執行失敗: {result.error or '未知錯誤'}"
                 print(f"❌ {message}")
             
             # 5. 語音回饋
@@ -23,6 +23,7 @@ from config import Config
 import logging
 import keyboard
 import asyncio
+import time
 
 class VoiceAIShell:
     """語音 AI 指令殼層主類"""
@@ -40,6 +41,10 @@ class VoiceAIShell:
         
         self.is_running = False
         
+        # 按鍵事件（需在事件迴圈中建立，見 start_listening）
+        self._space_evt = None
+        self._esc_evt = None
+        
     def setup_logging(self):
         """設定日誌系統"""
         logging.basicConfig(
@@ -63,44 +68,74 @@ class VoiceAIShell:
         if not await self.check_modules():
             return
             
-        while self.is_running:
-            try:
-                # 等待空白鍵觸發
-                if keyboard.is_pressed('space'):
-                    await self.process_voice_command()
-                    await asyncio.sleep(0.5)  # 防止重複觸發
+        # 以鍵盤事件喚醒主循環，取代輪詢；keyboard 的回呼在其他執行緒執行，
+        # 需透過 call_soon_threadsafe 設定事件
+        loop = asyncio.get_running_loop()
+        self._space_evt = asyncio.Event()
+        self._esc_evt = asyncio.Event()
+        hooks = [
+            keyboard.on_press_key(
+                self.config.ACTIVATION_KEY,
+                lambda e: loop.call_soon_threadsafe(self._space_evt.set)
+            ),
+            keyboard.on_press_key(
+                self.config.EXIT_KEY,
+                lambda e: loop.call_soon_threadsafe(self._esc_evt.set)
+            )
+        ]
+        
+        try:
+            while self.is_running:
+                try:
+                    # 等待空白鍵或 ESC
+                    space_task = asyncio.create_task(self._space_evt.wait())
+                    esc_task = asyncio.create_task(self._esc_evt.wait())
+                    done, pending = await asyncio.wait(
+                        {space_task, esc_task},
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in pending:
+                        task.cancel()
                     
-                elif keyboard.is_pressed('esc'):
-                    self.logger.info("👋 正在退出 Voice AI Shell...")
-                    break
+                    if esc_task in done:
+                        self.logger.info("👋 正在退出 Voice AI Shell...")
+                        break
                     
-                await asyncio.sleep(0.1)  # 避免 CPU 過載
-                
-            except KeyboardInterrupt:
-                self.logger.info("👋 接收到中斷信號，正在退出...")
-                break
-            except Exception as e:
-                self.logger.error(f"❌ 主循環錯誤: {e}")
+                    try:
+                        await self.process_voice_command()
+                    finally:
+                        # 處理期間的按鍵不重複觸發
+                        self._space_evt.clear()
+                    
+                except KeyboardInterrupt:
+                    self.logger.info("👋 接收到中斷信號，正在退出...")
+                    break
+                except Exception as e:
+                    self.logger.error(f"❌ 主循環錯誤: {e}")
+        finally:
+            for hook in hooks:
+                keyboard.unhook(hook)
                 
         self.is_running = False
         
     async def check_modules(self):
-        """檢查所有模組是否正常"""
+        """檢查所有模組是否正常（各模組同時初始化，Whisper 與 XTTS 模型並行載入）"""
         self.logger.info("🔍 檢查模組狀態...")
         
-        checks = [
-            ("Whisper 語音輸入", self.whisper_input.is_ready()),
-            ("AI 指令解析", self.ai_parser.is_ready()),
-            ("指令執行器", self.command_executor.is_ready()),
-            ("XTTS 語音輸出", await self.xtts_output.is_ready())
-        ]
+        loop = asyncio.get_running_loop()
+        checks = await asyncio.gather(
+            self._timed_check("Whisper 語音輸入", loop.run_in_executor(None, self.whisper_input.is_ready)),
+            self._timed_check("AI 指令解析", loop.run_in_executor(None, self.ai_parser.is_ready)),
+            self._timed_check("指令執行器", loop.run_in_executor(None, self.command_executor.is_ready)),
+            self._timed_check("XTTS 語音輸出", self.xtts_output.is_ready())
+        )
         
         all_ready = True
-        for name, status in checks:
+        for name, status, elapsed in checks:
             if status:
-                self.logger.info(f"  ✅ {name}")
+                self.logger.info(f"  ✅ {name} ({elapsed:.2f} 秒)")
             else:
-                self.logger.error(f"  ❌ {name}")
+                self.logger.error(f"  ❌ {name} ({elapsed:.2f} 秒)")
                 all_ready = False
                 
         if all_ready:
@@ -109,6 +144,21 @@ class VoiceAIShell:
             self.logger.error("❌ 部分模組未就緒，請檢查設定")
             
         return all_ready
+    
+    async def _timed_check(self, name: str, check) -> tuple:
+        """
+        等待模組檢查並記錄耗時
+        
+        Args:
+            name: 模組名稱
+            check: 模組 is_ready 的 awaitable
+            
+        Returns:
+            (模組名稱, 是否就緒, 耗時秒數)
+        """
+        start = time.perf_counter()
+        status = await check
+        return name, status, time.perf_counter() - start
         
     async def process_voice_command(self):
         """處理語音指令的完整流程"""
@@ -124,7 +174,8 @@ class VoiceAIShell:
             self.logger.info(f"🎤 語音識別: {audio_text}")
             
             # 2. AI 指令解析
-            command_info = await self.ai_parser.parse_natural_language(audio_text)
+            text_norm = audio_text.strip().casefold()
+            command_info = self.ai_parser.parse_natural_language(audio_text, text_norm)
             if not command_info:
                 await self.xtts_output.speak("我不知道如何執行這個指令")
                 return
@@ -136,14 +187,20 @@ class VoiceAIShell:
                 await self.xtts_output.speak("這個指令可能不安全，我無法執行")
                 return
                 
-            # 4. 執行指令
-            result = await self.command_executor.execute(command_info)
+            # 4. 執行指令，同時播放確認語音
+            ack_task = asyncio.create_task(self.xtts_output.speak("收到"))
+            exec_task = asyncio.create_task(self.command_executor.execute(command_info))
+            
+            await ack_task
+            if not exec_task.done():
+                await self.xtts_output.speak("指令執行中")
+            result = await exec_task
             
             # 5. 語音回饋 (XTTS)
-            if result['success']:
-                feedback = f"指令執行成功。{result.get('message', '')}"
+            if result.success:
+                feedback = "指令執行成功。"
             else:
-                feedback = f"指令執行失敗: {result.get('error', '未知錯誤')}"
+                feedback = f"指令執行失敗: {result.error or '未知錯誤'}"
                 
             await self.xtts_output.speak(feedback)
             
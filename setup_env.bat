@@ -45,6 +45,13 @@ if "%choice%"=="1" (
     echo.
     echo 📦 安裝完整套件...
     pip install -r requirements.txt
+    
+    echo.
+    echo 🔊 下載 Piper 中文語音模型...
+    if not exist voices mkdir voices
+    curl -L --fail -o voices\zh_CN-huayan-medium.onnx "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0/zh/zh_CN/huayan/medium/zh_CN-huayan-medium.onnx"
+    curl -L --fail -o voices\zh_CN-huayan-medium.onnx.json "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0/zh/zh_CN/huayan/medium/zh_CN-huayan-medium.onnx.json"
+    if errorlevel 1 echo ⚠️ 語音模型下載失敗，將改用 XTTS／pyttsx3（可參考 README 手動下載）
 ) else if "%choice%"=="2" (
     echo.
     echo 📦 安裝基礎套件...
@@ -45,6 +45,13 @@ case $choice in
         echo
         echo "📦 安裝完整套件..."
         pip install -r requirements.txt
+        
+        echo
+        echo "🔊 下載 Piper 中文語音模型..."
+        mkdir -p voices
+        curl -L --fail -o voices/zh_CN-huayan-medium.onnx "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0/zh/zh_CN/huayan/medium/zh_CN-huayan-medium.onnx" && \
+        curl -L --fail -o voices/zh_CN-huayan-medium.onnx.json "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0/zh/zh_CN/huayan/medium/zh_CN-huayan-medium.onnx.json" || \
+        echo "⚠️ 語音模型下載失敗，將改用 XTTS／pyttsx3（可參考 README 手動下載）"
         ;;
     2)
         echo
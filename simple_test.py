@@ -72,7 +72,7 @@ class SimpleAIShell:
         print(f"\n🧠 解析: {text}")
         
         # 1. AI 指令解析
-        command_info = await self.ai_parser.parse_natural_language(text)
+        command_info = self.ai_parser.parse_natural_language(text)
         if not command_info:
             print("❓ 我不知道如何執行這個指令")
             return
@@ -88,12 +88,12 @@ class SimpleAIShell:
         result = await self.command_executor.execute(command_info)
         
         # 4. 顯示結果
-        if result['success']:
+        if result.success:
             print("✅ 指令執行成功")
-            if result['output']:
-                print(f"📄 執行結果:\n{result['output']}")
+            if result.output:
+                print(f"📄 執行結果:\n{result.output}")
         else:
-            print(f"❌ 指令執行失敗: {result.get('error', '未知錯誤')}")
+            print(f"❌ 指令執行失敗: {result.error or '未知錯誤'}")
 
 async def main():
     """主程式"""
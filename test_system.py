@@ -78,7 +78,7 @@ def test_config():
         print(f"❌ 設定模組測試失敗: {e}")
         return False
 
-async def test_ai_parser():
+def test_ai_parser():
     """測試 AI 指令解析器"""
     print("\n🔍 測試 3: AI 指令解析器")
     print("=" * 50)
@@ -102,7 +102,7 @@ async def test_ai_parser():
         ]
         
         for cmd in test_commands:
-            result = await parser.parse_natural_language(cmd)
+            result = parser.parse_natural_language(cmd)
             if result:
                 print(f"✅ 成功解析: '{cmd}' → {result['command']}")
             else:
@@ -155,7 +155,7 @@ def test_dependencies():
     print("=" * 50)
     
     dependencies = [
-        ("whisper", "OpenAI Whisper"),
+        ("faster_whisper", "faster-whisper"),
         ("torch", "PyTorch"),
         ("numpy", "NumPy"),
         ("pygame", "Pygame"),
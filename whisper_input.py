@@ -2,18 +2,100 @@
 Whisper 語音輸入模組
 ====================
 
-使用 OpenAI Whisper 進行高精度的語音轉文字
+使用 faster-whisper（CTranslate2 引擎）進行高精度的語音轉文字，
+有 CUDA GPU 且安裝 transformers 時改用 fp16 + SDPA 的 Transformers pipeline
 支援中文和英文語音識別
 """
 
-import whisper
-import pyaudio
+from __future__ import annotations
+
+import os
+import importlib.util
 import wave
 import tempfile
 import asyncio
 import logging
-from typing import Optional
-import numpy as np
+from typing import Optional, List, Tuple, AsyncIterator, TYPE_CHECKING
+
+# 語音辨識與音訊套件載入耗時（PyTorch、CUDA 探測等），於 is_ready 時才導入
+if TYPE_CHECKING:
+    import numpy as np
+
+# 可選的 Transformers 後端（僅在 GPU 上使用）
+TRANSFORMERS_AVAILABLE = importlib.util.find_spec("transformers") is not None
+
+# 可選的 Silero VAD 語音偵測
+SILERO_VAD_AVAILABLE = importlib.util.find_spec("silero_vad") is not None
+
+Segment = Tuple[float, float, str]
+
+class _FasterWhisperBackend:
+    """faster-whisper（CTranslate2 INT8）轉錄後端"""
+    
+    def __init__(self, model_size: str, use_cuda: bool):
+        from faster_whisper import WhisperModel
+        
+        # 有 CUDA 時權重 int8、運算 float16，CPU 則全程 int8
+        self.model = WhisperModel(
+            model_size,
+            device="auto",
+            compute_type="int8_float16" if use_cuda else "int8",
+            num_workers=1,
+            cpu_threads=os.cpu_count() or 0
+        )
+    
+    def transcribe(self, audio_data: np.ndarray) -> List[Segment]:
+        # segments 是惰性產生器，需在此走訪完畢才會實際解碼
+        segments, _ = self.model.transcribe(
+            audio_data,
+            language="zh",  # 中文優先
+            vad_filter=True,  # 略過靜音片段
+            beam_size=1,
+            condition_on_previous_text=False
+        )
+        return [(segment.start, segment.end, segment.text) for segment in segments]
+
+class _TransformersBackend:
+    """Hugging Face Transformers 轉錄後端（CUDA fp16）"""
+    
+    def __init__(self, model_size: str):
+        import torch
+        from transformers import pipeline
+        
+        # CTranslate2 偵測到 GPU 不代表 PyTorch 有 CUDA 支援（例如 Windows 預設的 CPU 版 torch）
+        if not torch.cuda.is_available():
+            raise RuntimeError("PyTorch 未支援 CUDA")
+        
+        # Ampere 以上且安裝 flash-attn 時使用 FlashAttention 2，否則使用 PyTorch SDPA
+        major, _ = torch.cuda.get_device_capability(0)
+        if major >= 8 and importlib.util.find_spec("flash_attn") is not None:
+            attn_implementation = "flash_attention_2"
+        else:
+            attn_implementation = "sdpa"
+        
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            f"openai/whisper-{model_size}",
+            torch_dtype=torch.float16,
+            device="cuda:0",
+            model_kwargs={"attn_implementation": attn_implementation}
+        )
+    
+    def transcribe(self, audio_data: np.ndarray) -> List[Segment]:
+        # 超過 30 秒的輸入切塊後批次解碼
+        result = self.pipe(
+            {"raw": audio_data, "sampling_rate": 16000},
+            chunk_length_s=30,
+            batch_size=8,
+            return_timestamps=True,
+            generate_kwargs={"language": "zh", "task": "transcribe"}
+        )
+        duration = len(audio_data) / 16000
+        segments = []
+        for chunk in result.get("chunks", []):
+            start, end = chunk["timestamp"]
+            segments.append((start or 0.0, duration if end is None else end, chunk["text"]))
+        return segments
 
 class WhisperInput:
     """Whisper 語音輸入處理類"""
@@ -35,17 +117,91 @@ class WhisperInput:
         self.chunk = 1024
         self.record_seconds = 5  # 預設錄音時長
         
-        # PyAudio 設定
-        self.audio = pyaudio.PyAudio()
+        # 串流轉錄設定：錄音中每累積一個視窗就送交轉錄，
+        # 結束時間早於緩衝區尾端 commit_margin 秒的片段視為已確定
+        self.stream_window = 1.0
+        self.commit_margin = 1.0
+        
+        # PyAudio 與 NumPy（於 is_ready 時載入）
+        self.audio = None
+        self._stream = None
+        self._pyaudio = None
+        self._np = None
+        
+        # 錄音緩衝區：由 PyAudio 回呼（_cb）直接寫入，錄音之間重複使用
+        self._ring = None
+        self._write_idx = 0
+        self._record_total = 0
+        self._notified_idx = 0
+        self._window_samples = 0
+        self._windows = None
+        self._loop = None
+        
+        # VAD 設定：每 512 個樣本（32 毫秒）判斷一次是否有語音，
+        # 偵測到語音後靜音超過 vad_end_silence 秒即提前結束錄音
+        self.vad_frame = 512
+        self.vad_speech_prob = 0.5
+        self.vad_silence_prob = 0.3
+        self.vad_end_silence = 0.5
+        self.vad_min_speech = 0.2
+        self._vad = None
+        self._torch = None
+        self._vad_probs = None
+        self._vad_idx = 0
+        self._vad_load_failed = False
+        self._speech_frames = 0
+        self._silence_frames = 0
         
     def is_ready(self) -> bool:
         """檢查 Whisper 是否準備就緒"""
         try:
+            if self.audio is None:
+                import numpy
+                import pyaudio
+                self._np = numpy
+                self._pyaudio = pyaudio
+                self.audio = pyaudio.PyAudio()
+                
+            if self._stream is None:
+                # 輸入串流常駐開啟，錄音時只啟動／停止，避免每次重新協商裝置參數
+                self._stream = self.audio.open(
+                    format=self._pyaudio.paInt16,
+                    channels=self.channels,
+                    rate=self.sample_rate,
+                    input=True,
+                    frames_per_buffer=self.chunk,
+                    stream_callback=self._cb,
+                    start=False
+                )
+                
             if self.model is None:
+                import ctranslate2
+                
                 self.logger.info(f"載入 Whisper 模型: {self.model_size}")
-                self.model = whisper.load_model(self.model_size)
+                use_cuda = ctranslate2.get_cuda_device_count() > 0
+                if use_cuda and TRANSFORMERS_AVAILABLE:
+                    try:
+                        self.model = _TransformersBackend(self.model_size)
+                    except Exception as e:
+                        self.logger.warning(f"Transformers 後端無法使用，改用 faster-whisper: {e}")
+                if self.model is None:
+                    self.model = _FasterWhisperBackend(self.model_size, use_cuda)
                 self.logger.info("✅ Whisper 模型載入完成")
                 
+            if self._vad is None and SILERO_VAD_AVAILABLE and not self._vad_load_failed:
+                # VAD 只是提前結束錄音的輔助功能，載入失敗時改用固定錄音時長
+                try:
+                    import torch
+                    from silero_vad import load_silero_vad
+                    
+                    self._torch = torch
+                    self._vad = load_silero_vad()
+                    self.logger.info("✅ Silero VAD 載入完成")
+                except Exception as e:
+                    self._vad = None
+                    self._vad_load_failed = True
+                    self.logger.warning(f"Silero VAD 載入失敗，改用固定錄音時長: {e}")
+                
             # 檢查麥克風
             device_count = self.audio.get_device_count()
             if device_count == 0:
@@ -71,101 +227,243 @@ class WhisperInput:
         if not self.is_ready():
             return None
             
+        # 錄音與轉錄同時進行：錄音端將視窗放入佇列，轉錄端逐步消化
+        queue: asyncio.Queue = asyncio.Queue()
+        consumer = asyncio.create_task(self._consume_stream(queue))
         try:
-            # 錄音
-            audio_data = await self._record_audio(duration or self.record_seconds)
-            if audio_data is None:
-                return None
-                
-            # 轉錄
-            result = await self._transcribe_audio(audio_data)
-            return result
+            self.logger.info(f"🎤 開始錄音 ({duration or self.record_seconds}秒)...")
+            async for window in self._record_audio(duration or self.record_seconds):
+                queue.put_nowait(window)
+            self.logger.info("🎤 錄音完成")
+            
+            queue.put_nowait(None)
+            return await consumer
             
         except Exception as e:
+            consumer.cancel()
             self.logger.error(f"語音轉錄失敗: {e}")
             return None
     
-    async def _record_audio(self, duration: float) -> Optional[np.ndarray]:
+    async def _record_audio(self, duration: float) -> AsyncIterator[np.ndarray]:
         """
-        錄製音訊
+        錄製音訊，每累積 stream_window 秒產生一個視窗
+        
+        PyAudio 以回呼模式在自己的執行緒讀取 int16 樣本，直接寫入預先配置的緩衝區，
+        每湊滿一個視窗才通知事件迴圈一次，不會阻塞其他協程；
+        只有交給 Whisper 的視窗才轉換為 float32
         
         Args:
             duration: 錄音時長
             
-        Returns:
-            音訊數據數組
+        Yields:
+            float32 音訊視窗
         """
+        np = self._np
+        total = int(self.sample_rate * duration)
+        if self._ring is None or len(self._ring) < total:
+            self._ring = np.empty(total, dtype=np.int16)
+        
+        self._loop = asyncio.get_running_loop()
+        self._windows = asyncio.Queue()
+        self._record_total = total
+        self._notified_idx = 0
+        self._window_samples = int(self.sample_rate * self.stream_window)
+        
+        if self._vad is not None:
+            frames = total // self.vad_frame + 1
+            if self._vad_probs is None or len(self._vad_probs) < frames:
+                self._vad_probs = np.empty(frames, dtype=np.float32)
+            self._vad.reset_states()
+            self._vad_idx = 0
+            self._speech_frames = 0
+            self._silence_frames = 0
+        
+        self.start_capture()
         try:
-            self.logger.info(f"🎤 開始錄音 ({duration}秒)...")
+            sent = 0
+            # 偵測到語音結束時 _cb 會縮短 _record_total
+            while sent < self._record_total:
+                end = await self._windows.get()
+                window = self._ring[sent:end].astype(np.float32) * (1.0 / 32768.0)
+                if self._vad is not None:
+                    self._mute_non_speech(window, sent)
+                yield window
+                sent = end
             
-            # 開啟音訊流
-            stream = self.audio.open(
-                format=pyaudio.paFloat32,
-                channels=self.channels,
-                rate=self.sample_rate,
-                input=True,
-                frames_per_buffer=self.chunk
-            )
-            
-            frames = []
-            frames_to_record = int(self.sample_rate / self.chunk * duration)
-            
-            for _ in range(frames_to_record):
-                data = stream.read(self.chunk)
-                frames.append(data)
-                await asyncio.sleep(0.01)  # 讓出控制權
-                
-            stream.stop_stream()
-            stream.close()
-            
-            # 轉換為 numpy 數組
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.float32)
+            if self._record_total < total:
+                self.logger.info("🎤 偵測到語音結束")
+        finally:
+            self.stop_capture()
+    
+    def start_capture(self):
+        """開始擷取音訊（寫入位置歸零）"""
+        self._write_idx = 0
+        self._stream.start_stream()
+    
+    def stop_capture(self):
+        """停止擷取音訊（串流保持開啟供下次使用）"""
+        self._stream.stop_stream()
+    
+    def _cb(self, in_data, frame_count, time_info, status):
+        """
+        PyAudio 錄音回呼（於 PortAudio 執行緒執行）
+        
+        樣本直接寫入預先配置的緩衝區，湊滿一個視窗或錄音結束時才通知事件迴圈；
+        錄音結束後串流仍在執行（常駐串流不能以 paComplete 結束），多餘的樣本直接略過
+        """
+        start = self._write_idx
+        if start >= self._record_total:
+            return (None, self._pyaudio.paContinue)
+        
+        samples = self._np.frombuffer(in_data, dtype=self._np.int16)[:self._record_total - start]
+        end = start + len(samples)
+        self._ring[start:end] = samples
+        self._write_idx = end
+        
+        if self._vad is not None and self._detect_speech_end(end):
+            self._record_total = end
+        
+        finished = end >= self._record_total
+        if finished or end - self._notified_idx >= self._window_samples:
+            self._notified_idx = end
+            self._loop.call_soon_threadsafe(self._windows.put_nowait, end)
+        return (None, self._pyaudio.paContinue)
+    
+    def _detect_speech_end(self, end: int) -> bool:
+        """
+        以 Silero VAD 判斷新寫入的樣本（於錄音回呼中執行）
+        
+        機率高於 vad_speech_prob 視為語音，低於 vad_silence_prob 視為靜音，
+        兩者之間維持原狀態（遲滯），避免在句中停頓時誤判結束
+        
+        Args:
+            end: 目前已寫入的樣本數
             
-            self.logger.info("🎤 錄音完成")
-            return audio_data
+        Returns:
+            偵測到語音後已靜音超過 vad_end_silence 秒時返回 True
+        """
+        np = self._np
+        end_silence_frames = self.vad_end_silence * self.sample_rate / self.vad_frame
+        
+        while (self._vad_idx + 1) * self.vad_frame <= end:
+            start = self._vad_idx * self.vad_frame
+            frame = self._ring[start:start + self.vad_frame].astype(np.float32) * (1.0 / 32768.0)
+            prob = self._vad(self._torch.from_numpy(frame), self.sample_rate).item()
+            self._vad_probs[self._vad_idx] = prob
+            self._vad_idx += 1
             
-        except Exception as e:
-            self.logger.error(f"錄音失敗: {e}")
-            return None
+            if prob >= self.vad_speech_prob:
+                self._speech_frames += 1
+                self._silence_frames = 0
+            elif prob < self.vad_silence_prob and self._speech_frames:
+                self._silence_frames += 1
+                if self._silence_frames >= end_silence_frames:
+                    return True
+        return False
     
-    async def _transcribe_audio(self, audio_data: np.ndarray) -> Optional[str]:
+    def _mute_non_speech(self, window: np.ndarray, offset: int):
         """
-        轉錄音訊數據
+        將 VAD 判定為非語音（機率低於 vad_silence_prob）的片段靜音
+        
+        只處理已判斷過的完整片段；保留原本長度，讓轉錄片段的時間戳記維持正確
         
         Args:
-            audio_data: 音訊數據
+            window: float32 音訊視窗（就地修改）
+            offset: 視窗在錄音緩衝區中的起始位置
+        """
+        first = offset // self.vad_frame
+        last = min((offset + len(window)) // self.vad_frame, self._vad_idx)
+        for index in range(first, last):
+            if self._vad_probs[index] < self.vad_silence_prob:
+                start = index * self.vad_frame - offset
+                window[max(start, 0):start + self.vad_frame] = 0.0
+    
+    def _has_speech(self) -> bool:
+        """目前錄音中的語音是否已達 vad_min_speech 秒（未啟用 VAD 時永遠為 True）"""
+        if self._vad is None:
+            return True
+        return self._speech_frames * self.vad_frame >= self.vad_min_speech * self.sample_rate
+    
+    async def _consume_stream(self, queue: asyncio.Queue) -> Optional[str]:
+        """
+        串流轉錄：錄音期間持續轉錄已收到的音訊
+        
+        每次轉錄後，結束於緩衝區尾端 commit_margin 秒以前的片段視為已確定並移出緩衝區，
+        其餘音訊留待下次（可能還有後續語音）；錄音結束後再轉錄剩餘的尾段
+        
+        Args:
+            queue: 音訊視窗佇列，None 表示錄音結束
             
         Returns:
             轉錄文字
         """
-        try:
-            self.logger.info("🧠 正在進行語音識別...")
+        loop = asyncio.get_event_loop()
+        committed = []
+        pending = []
+        finished = False
+        started = False
+        
+        while not finished:
+            # 轉錄期間累積的視窗一次取出
+            pending.append(await queue.get())
+            while not queue.empty():
+                pending.append(queue.get_nowait())
+            if pending[-1] is None:
+                pending.pop()
+                finished = True
+            # 尚未偵測到足夠語音時不啟動轉錄
+            if not pending or not self._has_speech():
+                continue
             
-            # 在執行緒中運行 Whisper 轉錄（避免阻塞）
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
-                lambda: self.model.transcribe(
-                    audio_data,
-                    language="zh",  # 中文優先
-                    task="transcribe"
-                )
-            )
+            audio = self._np.concatenate(pending) if len(pending) > 1 else pending[0]
+            pending = [audio]
+            if not started:
+                self.logger.info("🧠 正在進行語音識別...")
+                started = True
+            segments = await loop.run_in_executor(None, self._transcribe_segments, audio)
             
-            text = result["text"].strip()
+            if finished:
+                # 尾段：全部片段皆已確定
+                committed.extend(text for _, _, text in segments)
+                break
             
-            if text:
-                self.logger.info(f"🎤 識別結果: {text}")
-                return text
-            else:
-                self.logger.warning("語音識別結果為空")
-                return None
-                
-        except Exception as e:
-            self.logger.error(f"語音轉錄失敗: {e}")
+            buffer_end = len(audio) / self.sample_rate
+            cut = 0.0
+            for _, end, text in segments:
+                if end > buffer_end - self.commit_margin:
+                    break
+                committed.append(text)
+                cut = end
+            if cut:
+                pending = [audio[int(cut * self.sample_rate):]]
+        
+        if not self._has_speech():
+            self.logger.warning("未偵測到語音")
             return None
+        
+        text = "".join(committed).strip()
+        if text:
+            self.logger.info(f"🎤 識別結果: {text}")
+            return text
+        
+        self.logger.warning("語音識別結果為空")
+        return None
+    
+    def _transcribe_segments(self, audio_data: np.ndarray) -> List[Segment]:
+        """
+        同步轉錄音訊（於執行緒中執行）
+        
+        Args:
+            audio_data: 音訊數據
+            
+        Returns:
+            (開始秒數, 結束秒數, 文字) 片段清單
+        """
+        return self.model.transcribe(audio_data)
     
     def __del__(self):
         """清理資源"""
+        if getattr(self, '_stream', None):
+            self._stream.close()
         if hasattr(self, 'audio') and self.audio:
             self.audio.terminate()
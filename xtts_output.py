@@ -4,24 +4,46 @@ XTTS 語音輸出模組
 
 使用 XTTS (Coqui TTS) 進行高品質的語音合成
 相比系統內建 TTS 提供更自然的語音體驗
+互動回覆預設使用輕量的 Piper 語音（ONNX），XTTS 用於保存高品質音訊
 """
 
+from __future__ import annotations
+
 import logging
 import asyncio
 import tempfile
 import os
-from typing import Optional
-import pygame
+import functools
+import importlib.util
+from typing import Optional, Dict, Tuple, TYPE_CHECKING
 import io
+from config import Config
 
-# 嘗試導入 XTTS 相關模組
-try:
-    from TTS.api import TTS
-    XTTS_AVAILABLE = True
-except ImportError:
-    XTTS_AVAILABLE = False
+if TYPE_CHECKING:
+    import numpy as np
+
+# 只檢查 XTTS 是否安裝，實際導入（含 PyTorch）延後到載入模型時
+XTTS_AVAILABLE = importlib.util.find_spec("TTS") is not None
+if not XTTS_AVAILABLE:
     print("⚠️ XTTS 未安裝，將使用系統內建 TTS")
 
+# Piper 輕量語音合成（互動回覆用）
+PIPER_AVAILABLE = importlib.util.find_spec("piper") is not None
+
+# 串流播放（需要 PortAudio，未安裝時退回 pygame 播放檔案）
+try:
+    import sounddevice as sd
+    SOUNDDEVICE_AVAILABLE = True
+except (ImportError, OSError):
+    SOUNDDEVICE_AVAILABLE = False
+
+# 讀取音訊檔案給 sounddevice 播放（未安裝時以 pygame 播放檔案）
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except (ImportError, OSError):
+    SOUNDFILE_AVAILABLE = False
+
 # 備用 TTS 引擎
 try:
     import pyttsx3
@@ -42,28 +64,80 @@ class XTTSOutput:
         self.logger = logging.getLogger(__name__)
         self.voice_model = voice_model
         self.tts_engine = None
+        self.piper_voice = None
         self.fallback_engine = None
+        self._xtts_load_failed = False  # 延遲載入 XTTS 失敗後不再重試
+        
+        # 播放鎖：多個 speak 同時呼叫時依序播放
+        # （於第一次播放時建立，確保綁定到執行中的事件迴圈）
+        self._speak_lock = None
         
-        # 初始化音訊播放
-        pygame.mixer.init()
+        # 預先合成的固定語句（文字 → PCM），需要 sounddevice 播放
+        self._phrase_cache: Dict[str, np.ndarray] = {}
+        self._sample_rate = 24000
         
         # 語音設定
         self.language = "zh"  # 中文
         self.speaker = "zh-cn-female-1"  # 預設說話者
         
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def _load_engine(cls, voice_model: str):
+        """
+        載入 XTTS 引擎（同一模型只載入一次，多個 XTTSOutput 共用）
+        
+        載入後先合成一句短語暖機，讓 CUDA kernel 與 cuDNN 演算法選擇
+        在啟動時完成，而不是落在第一次語音回饋上
+        
+        Args:
+            voice_model: XTTS 語音模型名稱
+            
+        Returns:
+            TTS 引擎
+        """
+        import torch
+        from TTS.api import TTS
+        
+        logger = logging.getLogger(__name__)
+        
+        # 輸入長度固定的卷積層由 cuDNN 自動選擇最快的演算法
+        torch.backends.cudnn.benchmark = True
+        
+        engine = TTS(voice_model)
+        
+        if Config.XTTS_WARMUP:
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+                warmup_path = temp_file.name
+            try:
+                engine.tts_to_file(
+                    text="你好",
+                    file_path=warmup_path,
+                    speaker=Config.XTTS_SPEAKER,
+                    language=Config.XTTS_LANGUAGE
+                )
+                logger.info("✅ XTTS 暖機完成")
+            except Exception as e:
+                logger.warning(f"XTTS 暖機失敗: {e}")
+            finally:
+                try:
+                    os.unlink(warmup_path)
+                except OSError:
+                    pass
+        
+        return engine
+        
     async def is_ready(self) -> bool:
-        """檢查 XTTS 是否準備就緒"""
+        """
+        檢查語音輸出是否準備就緒
+        
+        依 Config.TTS_BACKEND 選擇引擎，失敗時依序改用 Piper → XTTS → pyttsx3
+        """
         try:
+            if Config.TTS_BACKEND == "piper" and await self._setup_piper():
+                return True
+                
             if XTTS_AVAILABLE:
-                if self.tts_engine is None:
-                    self.logger.info("正在載入 XTTS 模型...")
-                    # 在執行緒中載入模型避免阻塞
-                    loop = asyncio.get_event_loop()
-                    self.tts_engine = await loop.run_in_executor(
-                        None, 
-                        lambda: TTS(self.voice_model)
-                    )
-                    self.logger.info("✅ XTTS 模型載入完成")
+                await self._load_xtts(synthesize_phrases=True)
                 return True
             else:
                 # 使用備用 TTS 引擎
@@ -73,6 +147,52 @@ class XTTSOutput:
             self.logger.error(f"XTTS 初始化失敗: {e}")
             return await self._setup_fallback_tts()
     
+    async def _load_xtts(self, synthesize_phrases: bool = False):
+        """
+        載入 XTTS 模型
+        
+        Args:
+            synthesize_phrases: 是否預先合成固定語句（XTTS 為主要引擎時）
+        """
+        if self.tts_engine is not None:
+            return
+            
+        self.logger.info("正在載入 XTTS 模型...")
+        # 在執行緒中載入模型避免阻塞
+        loop = asyncio.get_event_loop()
+        self.tts_engine = await loop.run_in_executor(
+            None,
+            self._load_engine,
+            self.voice_model
+        )
+        self.logger.info("✅ XTTS 模型載入完成")
+        
+        if synthesize_phrases and SOUNDDEVICE_AVAILABLE and Config.CANNED_PHRASES:
+            await loop.run_in_executor(None, self._synthesize_canned_phrases)
+    
+    async def _setup_piper(self) -> bool:
+        """設定 Piper 語音引擎（需要 sounddevice 串流播放）"""
+        if not (PIPER_AVAILABLE and SOUNDDEVICE_AVAILABLE):
+            return False
+            
+        try:
+            if self.piper_voice is None:
+                from piper.voice import PiperVoice
+                
+                self.logger.info("正在載入 Piper 語音模型...")
+                voice_path = str(Config.BASE_DIR / Config.PIPER_VOICE)
+                loop = asyncio.get_event_loop()
+                self.piper_voice = await loop.run_in_executor(
+                    None,
+                    lambda: PiperVoice.load(voice_path, use_cuda=False)
+                )
+                self.logger.info("✅ Piper 語音模型載入完成")
+            return True
+            
+        except Exception as e:
+            self.logger.warning(f"Piper 初始化失敗，改用 XTTS: {e}")
+            return False
+    
     async def _setup_fallback_tts(self) -> bool:
         """設定備用 TTS 引擎"""
         try:
@@ -113,14 +233,46 @@ class XTTSOutput:
         if not text or not text.strip():
             return False
             
+        if self._speak_lock is None:
+            self._speak_lock = asyncio.Lock()
+            
         try:
             self.logger.info(f"🔊 準備播放: {text}")
             
-            if self.tts_engine and XTTS_AVAILABLE:
-                return await self._speak_with_xtts(text, save_audio)
-            elif self.fallback_engine:
-                return await self._speak_with_fallback(text)
-            else:
+            async with self._speak_lock:
+                # 引擎失敗時依序改用 Piper → XTTS → pyttsx3
+                if self.piper_voice and not (save_audio and XTTS_AVAILABLE):
+                    if await self._speak_with_piper(text):
+                        return True
+                    self.logger.warning("Piper 播放失敗，改用其他語音引擎")
+                    
+                # Piper 為主要引擎時，XTTS 只在需要保存音訊或 Piper 失敗時才載入
+                if (self.piper_voice and XTTS_AVAILABLE and self.tts_engine is None
+                        and not self._xtts_load_failed):
+                    try:
+                        await self._load_xtts()
+                    except Exception as e:
+                        self._xtts_load_failed = True
+                        self.logger.error(f"XTTS 初始化失敗: {e}")
+                    
+                if self.tts_engine and XTTS_AVAILABLE:
+                    cached = None if save_audio else self._match_cached_phrase(text)
+                    if cached:
+                        phrase, audio = cached
+                        played = await self._play_pcm(audio)
+                        # 只有變動的尾段需要即時合成
+                        text = text[len(phrase):]
+                        if not text.strip():
+                            return played
+                    if await self._speak_with_xtts(text, save_audio):
+                        return True
+                    self.logger.warning("XTTS 播放失敗，改用備用 TTS 引擎")
+                    
+                if self.fallback_engine is None and PYTTSX3_AVAILABLE:
+                    await self._setup_fallback_tts()
+                if self.fallback_engine:
+                    return await self._speak_with_fallback(text)
+                    
                 self.logger.error("沒有可用的語音引擎")
                 return False
                 
@@ -128,8 +280,38 @@ class XTTSOutput:
             self.logger.error(f"語音播放失敗: {e}")
             return False
     
+    async def _speak_with_piper(self, text: str) -> bool:
+        """使用 Piper 串流合成並直接播放"""
+        try:
+            voice = self.piper_voice
+            
+            def _play_stream():
+                # 每合成一句就寫入輸出串流，write() 在緩衝區滿時阻塞
+                with sd.RawOutputStream(
+                    samplerate=voice.config.sample_rate,
+                    channels=1,
+                    dtype="int16"
+                ) as stream:
+                    for audio_bytes in voice.synthesize_stream_raw(text):
+                        stream.write(audio_bytes)
+            
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, _play_stream)
+            
+            self.logger.info("✅ 音訊播放完成")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Piper 語音合成失敗: {e}")
+            return False
+    
     async def _speak_with_xtts(self, text: str, save_audio: bool = False) -> bool:
         """使用 XTTS 進行語音合成"""
+        if SOUNDDEVICE_AVAILABLE and not save_audio:
+            speaker_latents = self._get_speaker_latents()
+            if speaker_latents is not None:
+                return await self._stream_with_xtts(text, *speaker_latents)
+        
         try:
             # 在執行緒中生成語音避免阻塞
             loop = asyncio.get_event_loop()
@@ -166,6 +348,143 @@ class XTTSOutput:
             self.logger.error(f"XTTS 語音合成失敗: {e}")
             return False
     
+    def _synthesize_canned_phrases(self):
+        """預先合成 Config.CANNED_PHRASES 中的固定語句（於執行緒中執行）"""
+        import numpy as np
+        
+        synthesizer = getattr(self.tts_engine, "synthesizer", None)
+        self._sample_rate = getattr(synthesizer, "output_sample_rate", 24000)
+        
+        for phrase in Config.CANNED_PHRASES:
+            try:
+                wav = self.tts_engine.tts(text=phrase, speaker=self.speaker, language=self.language)
+                self._phrase_cache[phrase] = np.asarray(wav, dtype=np.float32)
+            except Exception as e:
+                self.logger.warning(f"預先合成語句失敗 ({phrase}): {e}")
+        
+        self.logger.info(f"✅ 已預先合成 {len(self._phrase_cache)} 句固定語句")
+    
+    def _match_cached_phrase(self, text: str) -> Optional[Tuple[str, np.ndarray]]:
+        """
+        尋找可直接播放的預先合成語句
+        
+        完全相同的語句直接使用；以標點或空白結尾的語句（例如「指令執行失敗: 」）
+        也可作為前綴，只合成其後的變動部分
+        
+        Args:
+            text: 要播放的文字
+            
+        Returns:
+            (語句, PCM)，沒有可用快取時返回 None
+        """
+        audio = self._phrase_cache.get(text)
+        if audio is not None:
+            return text, audio
+        
+        best = None
+        for phrase, audio in self._phrase_cache.items():
+            if phrase[-1] in "。，：:, " and text.startswith(phrase):
+                if best is None or len(phrase) > len(best[0]):
+                    best = (phrase, audio)
+        return best
+    
+    async def _play_pcm(self, audio: np.ndarray, sample_rate: Optional[int] = None) -> bool:
+        """
+        播放記憶體中的 PCM 音訊
+        
+        由 PortAudio 回呼送出音訊，播放結束時 finished_callback 設定事件，
+        不需輪詢播放狀態
+        
+        Args:
+            audio: float32 音訊（單聲道一維或 (樣本數, 聲道數)）
+            sample_rate: 取樣率，None 表示使用 XTTS 輸出取樣率
+        """
+        try:
+            if audio.ndim == 1:
+                audio = audio.reshape(-1, 1)
+            
+            loop = asyncio.get_running_loop()
+            done = asyncio.Event()
+            position = 0
+            
+            def callback(outdata, frames, time, status):
+                nonlocal position
+                chunk = audio[position:position + frames]
+                outdata[:len(chunk)] = chunk
+                position += len(chunk)
+                if len(chunk) < frames:
+                    outdata[len(chunk):] = 0
+                    raise sd.CallbackStop
+            
+            stream = sd.OutputStream(
+                samplerate=sample_rate or self._sample_rate,
+                channels=audio.shape[1],
+                dtype="float32",
+                callback=callback,
+                finished_callback=lambda: loop.call_soon_threadsafe(done.set)
+            )
+            with stream:
+                await done.wait()
+            
+            self.logger.info("✅ 音訊播放完成")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"音訊播放失敗: {e}")
+            return False
+    
+    def _get_speaker_latents(self):
+        """
+        取得目前說話者的條件向量（串流合成需要）
+        
+        Returns:
+            (gpt_cond_latent, speaker_embedding)，模型不支援串流或找不到說話者時返回 None
+        """
+        model = getattr(getattr(self.tts_engine, "synthesizer", None), "tts_model", None)
+        if model is None or not hasattr(model, "inference_stream"):
+            return None
+        
+        speaker_manager = getattr(model, "speaker_manager", None)
+        speaker = speaker_manager.speakers.get(self.speaker) if speaker_manager else None
+        if not speaker:
+            return None
+        return speaker["gpt_cond_latent"], speaker["speaker_embedding"]
+    
+    async def _stream_with_xtts(self, text: str, gpt_cond_latent, speaker_embedding) -> bool:
+        """
+        以 XTTS 串流合成並直接播放
+        
+        每合成一段音訊就寫入輸出串流，不經過暫存檔，
+        第一段音訊合成完成即開始播放
+        """
+        try:
+            model = self.tts_engine.synthesizer.tts_model
+            sample_rate = getattr(getattr(model.config, "audio", None), "output_sample_rate", 24000)
+            
+            def _play_stream():
+                chunks = model.inference_stream(
+                    text,
+                    self.language,
+                    gpt_cond_latent,
+                    speaker_embedding,
+                    stream_chunk_size=20
+                )
+                # write() 在輸出緩衝區滿時阻塞，自然與合成速度同步；
+                # 離開 with 時會等待剩餘音訊播放完畢
+                with sd.OutputStream(samplerate=sample_rate, channels=1, dtype="float32") as stream:
+                    for chunk in chunks:
+                        stream.write(chunk.detach().cpu().numpy().reshape(-1, 1))
+            
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, _play_stream)
+            
+            self.logger.info("✅ 音訊播放完成")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"XTTS 串流合成失敗: {e}")
+            return False
+    
     async def _speak_with_fallback(self, text: str) -> bool:
         """使用備用 TTS 引擎"""
         try:
@@ -186,7 +505,21 @@ class XTTSOutput:
     
     async def _play_audio_file(self, file_path: str) -> bool:
         """播放音訊檔案"""
+        if SOUNDDEVICE_AVAILABLE and SOUNDFILE_AVAILABLE:
+            try:
+                audio, sample_rate = sf.read(file_path, dtype="float32", always_2d=True)
+            except Exception as e:
+                self.logger.error(f"音訊檔案讀取失敗: {e}")
+                return False
+            return await self._play_pcm(audio, sample_rate)
+        
         try:
+            import pygame
+            
+            # 第一次播放檔案時才初始化混音器
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            
             pygame.mixer.music.load(file_path)
             pygame.mixer.music.play()
             
@@ -217,6 +550,10 @@ class XTTSOutput:
         if language:
             self.language = language
             self.logger.info(f"語音語言設定為: {language}")
+            
+        # 預先合成的語句是舊說話者／語言的聲音，不再使用
+        if speaker or language:
+            self._phrase_cache.clear()
     
     def get_available_speakers(self) -> list:
         """取得可用的說話者清單"""